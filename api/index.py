@@ -1,8 +1,17 @@
 import os
 import re
+import hashlib
+import functools
+import gzip
+import pickle
+import tempfile
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import sys # 导入 sys 模块，用于日志重定向到 stdout
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, make_response, Response
 
 # ==================== 配置 ====================
 # 获取当前文件 (api/index.py) 的目录
@@ -14,6 +23,18 @@ DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
 # 更新文件路径以适应 Vercel 结构
 code_table_path = os.path.join(DATA_DIR, "代码表.txt")
 subway_code_table_path = os.path.join(DATA_DIR, "和平地铁美化代码.h")
+# 由 build_index.py 预先生成的代码表索引
+code_table_index_path = os.path.join(DATA_DIR, "index.pkl")
+# 索引数据结构发生变化时递增，旧索引会被忽略
+CODE_TABLE_INDEX_VERSION = 1
+# 代码表文件的候选编码，按顺序尝试
+try_encodings = ['utf-8', 'gbk']
+# 处理查询请求时等待后台加载代码表的最长时间（秒）
+CODE_TABLE_LOAD_TIMEOUT = 30
+# 查询结果只缓存 ID 数不超过该值的行，避免超长 ID 列表占用缓存内存
+QUERY_CACHE_MAX_CODES = 16
+# /process 流式输出时每次发送的行数
+STREAM_CHUNK_LINES = 500
 
 # 在 Vercel 的无服务器环境中，文件系统是只读且短暂的
 # 因此，日志不能写入本地文件，配置也不能持久化保存到本地文件。
@@ -21,10 +42,30 @@ subway_code_table_path = os.path.join(DATA_DIR, "和平地铁美化代码.h")
 # 对于配置保存功能，需要外部持久化存储（如数据库或云存储）。
 # 在此示例中，我们禁用本地文件日志和本地配置保存功能。
 
-item_dict = {}          # 所有 ID → 信息字典 {name, type, parent}
+# 代码表条目使用 namedtuple，比每条一个字典更省内存
+ItemInfo = namedtuple("ItemInfo", "name type parent")
+SubwayItemInfo = namedtuple("SubwayItemInfo", "name hex_code")
+
+# 以下代码表加载完成后以只读映射 (MappingProxyType) 对外暴露，防止被意外修改
+item_dict = {}          # 所有 ID → ItemInfo(name, type, parent)
 main_weapon_dict = {}   # 主枪 ID → 名称
 sub_to_main_dict = {}   # 子件 ID → 主枪 ID
-subway_item_dict = {}   # 新增：地铁美化 ID → 信息字典 {name, hex_code}
+subway_item_dict = {}   # 新增：地铁美化 ID → SubwayItemInfo(name, hex_code)
+_display_by_id = {}     # ID → 最终展示文本，由以上两张表合并预计算，查询时只需一次字典查找
+
+# 预编译的正则表达式，避免每次调用时重复查找编译缓存
+# 行首可选的空白字符后跟着一个或多个数字，数字之间可选地用逗号和空白分隔
+_LEADING_IDS_RE = re.compile(r"^\s*(\d+(?:\s*,\s*\d+)*)")
+# 通用代码表行格式: ID1 -- ID2 -- 名称 -- 0x十六进制，名称本身可能包含 "--"，因此以 " -- " 分隔
+# 不符合该格式的非空行由第二个分支整行捕获 (bad)，在同一次扫描中报告
+_GENERIC_RE = re.compile(
+    r"^[^\S\n]*(?:"
+    r"(\d+)[^\S\n]* -- [^\S\n]*(\d+)[^\S\n]* -- [^\S\n]*(.*?)[^\S\n]* -- (?=[^\n]*\S)"
+    r"|(?P<bad>\S[^\n]*))",
+    re.M,
+)
+# 地铁美化代码表行格式: {ID}--{ID}--[名称]--[0x十六进制]
+_SUBWAY_RE = re.compile(r"\{(\d+)\}--\{\d+\}--\[([^\]]+)\]--\[(0x[0-9a-fA-F]+)\]")
 
 # ==================== 日志配置 (已简化，确保 INFO 级别并输出到 stdout) ====================
 def setup_logging():
@@ -44,6 +85,20 @@ logger = logging.getLogger(__name__)
 
 
 # ==================== 代码表加载辅助函数 ====================
+def read_file_bytes(file_path):
+    """以二进制方式一次性读入整个文件；存在同名 .gz 压缩文件时优先读取并解压。"""
+    # 部署时可以只提供 gzip 压缩后的代码表，减小部署包体积和冷启动时读取的字节数
+    gz_path = file_path + ".gz"
+    if os.path.exists(gz_path):
+        with gzip.open(gz_path, 'rb') as file:
+            return file.read()
+    with open(file_path, 'rb') as file:
+        return file.read()
+
+def read_text_file(file_path, encoding):
+    """一次性读入整个文件，再整体解码为文本。"""
+    return read_file_bytes(file_path).decode(encoding)
+
 def parse_generic_code_table(file_path, encoding):
     """解析常规物品代码表文件。"""
     parsed_items = {}
@@ -51,40 +106,43 @@ def parse_generic_code_table(file_path, encoding):
     sub_to_main = {}
 
     try:
-        with open(file_path, 'r', encoding=encoding) as file:
-            for line in file:
-                line = line.strip()
-                if not line:
-                    continue
-                parts = [p.strip() for p in line.split(" -- ")]
-                if len(parts) < 4:
-                    logger.warning(f"通用代码表格式不正确，跳过行: {line}")
-                    continue
-                try:
-                    id1, id2, name = int(parts[0]), int(parts[1]), parts[2]
-                    type_hint = "主件"
-                    if any(k in name for k in ["弹匣"]):
-                        type_hint = "弹匣"
-                    elif any(k in name for k in ["枪口"]):
-                        type_hint = "枪口"
-                    elif any(k in name for k in ["握把"]):
-                        type_hint = "握把"
-                    elif any(k in name for k in ["瞄具", "瞄准镜", "机瞄"]):
-                        type_hint = "机瞄"
-
-                    parent_id = None
-                    if type_hint != "主件":
-                        parent_id = id1
-                    else:
-                        parent_id = None
-
-                    parsed_items[id2] = {"name": name, "type": type_hint, "parent": parent_id}
-                    if type_hint == "主件":
-                        main_weapons[id2] = name
-                    else:
-                        sub_to_main[id2] = parent_id
-                except ValueError:
-                    logger.warning(f"通用代码表解析错误，无法转换ID: '{line}'")
+        # 整个文件一次性解码：实测比逐条解码名称字段更快
+        data = read_text_file(file_path, encoding)
+        # 与文本模式读取一致：\r\n 和单独的 \r 都视为换行，否则正则会把 \r 当作普通空白导致记录合并或被跳过
+        if "\r" in data:
+            data = data.replace("\r\n", "\n").replace("\r", "\n")
+
+        # 整个文件交给正则引擎一次扫描，避免逐行 strip/split 的解释器开销
+        for match in _GENERIC_RE.finditer(data):
+            bad_line = match.group("bad")
+            if bad_line is not None:
+                logger.warning(f"通用代码表格式不正确，跳过行: {bad_line.strip()}")
+                continue
+            id1, id2, name = int(match.group(1)), int(match.group(2)), match.group(3)
+            if "弹匣" in name:
+                type_hint = "弹匣"
+            elif "枪口" in name:
+                type_hint = "枪口"
+            elif "握把" in name:
+                type_hint = "握把"
+            elif "瞄具" in name or "瞄准镜" in name or "机瞄" in name:
+                type_hint = "机瞄"
+            else:
+                type_hint = "主件"
+
+            parent_id = None
+            if type_hint != "主件":
+                parent_id = id1
+            else:
+                parent_id = None
+
+            parsed_items[id2] = ItemInfo(name, type_hint, parent_id)
+            if type_hint == "主件":
+                main_weapons[id2] = name
+            else:
+                sub_to_main[id2] = parent_id
+    except UnicodeDecodeError:
+        raise # 交由 load_code_table 换用其他编码重试
     except FileNotFoundError:
         logger.error(f"错误: 通用代码表文件未找到或路径不正确: '{file_path}'")
     except Exception as e:
@@ -94,53 +152,39 @@ def parse_generic_code_table(file_path, encoding):
 def parse_subway_code_table_file(file_path, encoding):
     """解析地铁美化代码表文件。"""
     parsed_subway_items = {}
-    subway_pattern = re.compile(r"\{(\d+)\}--\{\d+\}--\[([^\]]+)\]--\[(0x[0-9a-fA-F]+)\]")
 
     try:
-        with open(file_path, 'r', encoding=encoding) as file:
-            for line in file:
-                line = line.strip()
-                if not line:
-                    continue
-                match = subway_pattern.match(line)
-                if match:
-                    try:
-                        item_id = int(match.group(1))
-                        name = match.group(2)
-                        hex_code = match.group(3)
-                        parsed_subway_items[item_id] = {"name": name, "hex_code": hex_code}
-                    except ValueError:
-                        logger.warning(f"地铁代码表解析错误，无法转换ID或Hex Code: '{line}'")
-                else:
-                    logger.warning(f"地铁代码表格式不匹配，跳过行: '{line}'")
+        data = read_text_file(file_path, encoding)
+        for line in data.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            match = _SUBWAY_RE.match(line)
+            if match:
+                try:
+                    item_id = int(match.group(1))
+                    name = match.group(2)
+                    hex_code = match.group(3)
+                    parsed_subway_items[item_id] = SubwayItemInfo(name, hex_code)
+                except ValueError:
+                    logger.warning(f"地铁代码表解析错误，无法转换ID或Hex Code: '{line}'")
+            else:
+                logger.warning(f"地铁代码表格式不匹配，跳过行: '{line}'")
+    except UnicodeDecodeError:
+        raise # 交由 load_code_table 换用其他编码重试
     except FileNotFoundError:
         logger.error(f"错误: 地铁美化代码表文件未找到或路径不正确: '{file_path}'")
     except Exception as e:
         logger.exception(f"解析地铁美化代码表时发生未知错误: {e}")
     return parsed_subway_items
 
-def load_code_table():
-    """加载所有配置代码表。"""
-    global item_dict, main_weapon_dict, sub_to_main_dict, subway_item_dict
-
-    # 在重新加载前清空所有字典
-    item_dict = {}
-    main_weapon_dict = {}
-    sub_to_main_dict = {}
-    subway_item_dict = {}
-
-    # 加载通用物品代码表
-    try_encodings = ['utf-8', 'gbk']
-    loaded_general = False
+def load_generic_code_table():
+    """按候选编码依次尝试加载通用物品代码表，返回 (物品字典, 主枪字典, 子件→主枪字典)。"""
     for encoding in try_encodings:
         try:
-            temp_item_dict, temp_main_weapon_dict, temp_sub_to_main_dict = parse_generic_code_table(code_table_path, encoding)
-            item_dict.update(temp_item_dict)
-            main_weapon_dict.update(temp_main_weapon_dict)
-            sub_to_main_dict.update(temp_sub_to_main_dict)
-            loaded_general = True
+            result = parse_generic_code_table(code_table_path, encoding)
             logger.info(f"通用代码表 '{code_table_path}' 使用 {encoding} 编码加载成功。")
-            break # 成功加载则跳出循环
+            return result
         except UnicodeDecodeError:
             logger.warning(f"通用代码表 '{code_table_path}' 使用 {encoding} 编码解码失败。")
         except FileNotFoundError:
@@ -149,19 +193,17 @@ def load_code_table():
         except Exception as e:
             logger.error(f"加载通用代码表时发生未知错误: {e}")
             break
-    if not loaded_general and not os.path.exists(code_table_path):
-         logger.error(f"经过所有尝试，通用代码表 '{code_table_path}' 未能加载。")
-
+    if not os.path.exists(code_table_path):
+        logger.error(f"经过所有尝试，通用代码表 '{code_table_path}' 未能加载。")
+    return {}, {}, {}
 
-    # 加载地铁美化代码表
-    loaded_subway = False
+def load_subway_code_table():
+    """按候选编码依次尝试加载地铁美化代码表，返回地铁物品字典。"""
     for encoding in try_encodings:
         try:
-            temp_subway_item_dict = parse_subway_code_table_file(subway_code_table_path, encoding)
-            subway_item_dict.update(temp_subway_item_dict)
-            loaded_subway = True
+            result = parse_subway_code_table_file(subway_code_table_path, encoding)
             logger.info(f"地铁美化代码表 '{subway_code_table_path}' 使用 {encoding} 编码加载成功。")
-            break # 成功加载则跳出循环
+            return result
         except UnicodeDecodeError:
             logger.warning(f"地铁美化代码表 '{subway_code_table_path}' 使用 {encoding} 编码解码失败。")
         except FileNotFoundError:
@@ -170,98 +212,316 @@ def load_code_table():
         except Exception as e:
             logger.error(f"加载地铁美化代码表时发生未知错误: {e}")
             break
-    if not loaded_subway and not os.path.exists(subway_code_table_path):
+    if not os.path.exists(subway_code_table_path):
         logger.error(f"经过所有尝试，地铁美化代码表 '{subway_code_table_path}' 未能加载。")
+    return {}
+
+def parse_code_tables():
+    """解析两张文本代码表，返回 (物品, 主枪, 子件→主枪, 地铁物品, 展示文本) 五个字典。"""
+    # 两张代码表互不依赖，放到两个线程中同时读取和解析，缩短冷启动时间
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        generic_future = executor.submit(load_generic_code_table)
+        subway_future = executor.submit(load_subway_code_table)
+        parsed_items, main_weapons, sub_to_main = generic_future.result()
+        parsed_subway_items = subway_future.result()
+
+    # 预先生成展示文本：通用物品优先于地铁美化物品，因此先写入地铁条目再由通用条目覆盖
+    display_by_id = {cid: f"{info.name} (地铁, {info.hex_code})" for cid, info in parsed_subway_items.items()}
+    display_by_id.update({cid: info.name for cid, info in parsed_items.items()})
+    return parsed_items, main_weapons, sub_to_main, parsed_subway_items, display_by_id
+
+# ==================== 预构建索引 ====================
+# 文本代码表在运行时不会变化，可以预先解析并保存为 pickle 索引 (见 build_index.py)，
+# 冷启动时直接读取索引，省去正则解析和字典构建。
+class _CodeTableUnpickler(pickle.Unpickler):
+    """只允许还原代码表条目类型，并按名称映射到当前模块，与构建索引时的模块名无关。"""
+    _classes = {"ItemInfo": ItemInfo, "SubwayItemInfo": SubwayItemInfo}
+
+    def find_class(self, module, name):
+        if name in self._classes:
+            return self._classes[name]
+        raise pickle.UnpicklingError(f"代码表索引中包含不允许的类型: {module}.{name}")
+
+def code_table_fingerprint():
+    """计算两张文本代码表的内容摘要，用于判断预构建索引是否已过期。"""
+    fingerprint = []
+    for file_path in (code_table_path, subway_code_table_path):
+        try:
+            fingerprint.append(hashlib.sha1(read_file_bytes(file_path)).hexdigest())
+        except FileNotFoundError:
+            fingerprint.append(None)
+    return tuple(fingerprint)
+
+def build_code_table_index(index_path=code_table_index_path):
+    """解析文本代码表并将结果写入 pickle 索引文件。"""
+    tables = parse_code_tables()
+    payload = {
+        "version": CODE_TABLE_INDEX_VERSION,
+        "fingerprint": code_table_fingerprint(),
+        "tables": tables,
+    }
+    # 先写入同目录下的临时文件再原子替换，读取方不会看到写了一半的索引
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            pickle.dump(payload, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    logger.info(f"代码表索引已写入 '{index_path}'。")
+
+def load_code_table_index():
+    """读取预构建的代码表索引；索引不存在、无法读取或已过期时返回 None。"""
+    try:
+        with open(code_table_index_path, 'rb') as file:
+            payload = _CodeTableUnpickler(file).load()
+        if payload["version"] != CODE_TABLE_INDEX_VERSION or payload["fingerprint"] != code_table_fingerprint():
+            logger.warning(f"代码表索引 '{code_table_index_path}' 已过期，请重新运行 build_index.py。改为解析文本代码表。")
+            return None
+        return payload["tables"]
+    except FileNotFoundError:
+        logger.info(f"未找到代码表索引 '{code_table_index_path}'，改为解析文本代码表。")
+    except Exception as e:
+        logger.warning(f"读取代码表索引失败，改为解析文本代码表: {e}")
+    return None
+
+def load_code_table():
+    """加载所有配置代码表，优先使用预构建索引。"""
+    global item_dict, main_weapon_dict, sub_to_main_dict, subway_item_dict, _display_by_id
+
+    tables = load_code_table_index()
+    if tables is None:
+        tables = parse_code_tables()
+    parsed_items, main_weapons, sub_to_main, parsed_subway_items, display_by_id = tables
 
+    item_dict = MappingProxyType(parsed_items)
+    main_weapon_dict = MappingProxyType(main_weapons)
+    sub_to_main_dict = MappingProxyType(sub_to_main)
+    subway_item_dict = MappingProxyType(parsed_subway_items)
+    _display_by_id = display_by_id
+    _query_cached.cache_clear() # 旧表的查询结果已失效
 
     logger.info(f"所有代码表加载完成: 总物品 {len(item_dict)}, 主枪 {len(main_weapon_dict)}, 地铁美化 {len(subway_item_dict)}")
 
 # ==================== 查询函数 ====================
-def query_item(codes):
-    """根据ID查询物品名称，支持通用物品和地铁美化物品。"""
+def _query_uncached(codes):
+    """查询 ID 元组，一次遍历同时生成 (ID 串, 名称串, 未找到的 ID 元组)。"""
+    ids_out = []
     results = []
-    logger.debug(f"开始查询 ID 列表: {codes}")
+    missing = []
+    # 循环内用到的方法预先绑定为局部变量，省去每次迭代的属性查找
+    get_display = _display_by_id.get # 已合并通用物品和地铁美化物品
+    append_id = ids_out.append
+    append_result = results.append
     for code in codes:
-        item_info = item_dict.get(code)
-        subway_info = subway_item_dict.get(code) # 同时检查地铁代码表
-        if item_info:
-            results.append(item_info["name"])
-        elif subway_info:
-            results.append(f"{subway_info['name']} (地铁, {subway_info['hex_code']})")
-        else:
-            results.append(f"未找到ID {code}")
-            logger.warning(f"未找到 ID: {code}")
-    logger.info(f"查询结果: {results}")
-    return ", ".join(results)
+        append_id(str(code))
+        display = get_display(code)
+        if display is None:
+            display = f"未找到ID {code}"
+            missing.append(code)
+        append_result(display)
+    return ", ".join(ids_out), ", ".join(results), tuple(missing)
+
+# _query_uncached 的缓存版本，代码表重新加载时清空。
+# 只有 ID 数不超过 QUERY_CACHE_MAX_CODES 的查询进入缓存，单个缓存条目的大小因此有上限
+_query_cached = functools.lru_cache(maxsize=4096)(_query_uncached)
+
+def _query_codes(codes):
+    """查询一组 ID，返回 (ID 串, 名称串)；较短的 ID 列表使用缓存结果。"""
+    codes = tuple(codes)
+    # 请求热路径上的日志使用惰性 %s 格式化，调试日志额外判断级别，避免构造用不到的大字符串
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("开始查询 ID 列表: %s", codes)
+    if len(codes) <= QUERY_CACHE_MAX_CODES:
+        id_string, names, missing = _query_cached(codes)
+    else:
+        id_string, names, missing = _query_uncached(codes)
+    # 未找到的 ID 每次查询都记录，不会因为命中缓存而被跳过
+    for code in missing:
+        logger.warning("未找到 ID: %s", code)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("查询结果: %s", names)
+    return id_string, names
+
+def query_item(codes):
+    """根据ID查询物品名称，支持通用物品和地铁美化物品。"""
+    return _query_codes(codes)[1]
+
+def process_line(line):
+    """处理一行输入：以 ID 开头的行在 ID 后添加 # 和查询结果，其余行去除首尾空白后原样返回。"""
+    stripped_line = line.strip()
+    # 快速路径：空行以及首字符不是数字的行（注释、文本）不可能匹配，直接原样返回，无需进入正则引擎
+    if not stripped_line or not stripped_line[0].isdigit():
+        return stripped_line
+
+    # 匹配行首可选的空白字符后跟着一个或多个数字，数字之间可选地用逗号和空白分隔
+    id_match = _LEADING_IDS_RE.match(stripped_line)
+
+    if not id_match:
+        return stripped_line # 如果不匹配数字，则原样返回该行
+
+    numbers_str = id_match.group(1) # 提取匹配到的数字字符串部分
+    numbers = []
+    try:
+        # 正则已保证只包含数字、逗号和空白，直接按逗号拆分；int() 会忽略首尾空白
+        numbers = [int(tok) for tok in numbers_str.split(",")]
+    except ValueError:
+        logger.warning("无法解析行首数字，跳过行: '%s'", line)
+        return stripped_line
+
+    if not numbers: # 如果提取不到任何数字（理论上id_match.group(1)会保证有，但多做一层检查）
+        return stripped_line
+
+    id_string, final_comment_from_bot = _query_codes(numbers)
+
+    # 构建输出行：如果有查询结果，则在ID后添加 # 和结果
+    # ID 串与查询结果首尾均无空白，无需再对整行 strip
+    return f"{id_string} #{final_comment_from_bot}" if final_comment_from_bot else id_string
+
+def iter_processed_chunks(text):
+    """逐段生成 process_text(text) 的结果，拼接后与 process_text 完全一致，用于流式响应。"""
+    lines = text.split("\n")
+    for start in range(0, len(lines), STREAM_CHUNK_LINES):
+        chunk = "\n".join([process_line(line) for line in lines[start:start + STREAM_CHUNK_LINES]])
+        yield chunk if start == 0 else "\n" + chunk
+
+def process_text(text):
+    """逐行处理整段输入文本，返回添加注释后的文本。"""
+    # 逐行处理而不是对整个输入做一次多行 finditer：实测后者更慢，
+    # 多行模式下正则引擎要在每个字符位置尝试 ^，而非 ID 行在这里只需一次 isdigit 判断
+    return "\n".join([process_line(line) for line in text.split("\n")])
 
 # ==================== Flask 应用 ====================
 # template_folder 必须是相对于此文件 (api/index.py) 的路径
 app = Flask(__name__, template_folder=os.path.join(BASE_DIR, '..', 'templates')) # 指定模板文件夹路径
 
-# 在 Vercel 上，应用启动时会执行这里的代码。
-# 确保在 app 实例创建后立即加载代码表，这样第一次请求到达时数据就可用。
-load_code_table()
-logger.info("代码表在 Flask 应用启动时已加载。")
+# 代码表在后台线程中加载，由收到的第一个请求触发，而不是在模块导入时启动：
+# 导入模块（如 build_index.py）没有副作用，预加载后 fork 出的工作进程也会各自启动加载线程。
+# 查询请求在使用代码表前等待 _ready。
+_ready = threading.Event()
+_loader_lock = threading.Lock()
+_loader_pid = None # 已启动加载线程的进程 ID
+
+def _load_code_table_in_background():
+    try:
+        load_code_table()
+        logger.info("代码表已在后台线程中加载完成。")
+    finally:
+        _ready.set() # 加载失败也要放行，由请求处理逻辑报告代码表未加载
+
+def start_loading_code_table():
+    """在当前进程中启动后台加载线程；已经启动或加载完成时什么也不做。"""
+    global _loader_pid
+    pid = os.getpid()
+    if _ready.is_set() or _loader_pid == pid:
+        return
+    with _loader_lock:
+        if _ready.is_set() or _loader_pid == pid:
+            return
+        _loader_pid = pid
+        threading.Thread(target=_load_code_table_in_background, name="load_code_table", daemon=True).start()
+
+@app.before_request
+def _start_loading_code_table():
+    start_loading_code_table()
+
+CODE_TABLE_NOT_LOADED_MESSAGE = "物品代码表和地铁美化代码表均未加载，请联系管理员检查服务器日志。"
+
+def code_tables_loaded():
+    """等待后台加载结束，返回是否至少有一个代码表加载成功。"""
+    if not _ready.wait(timeout=CODE_TABLE_LOAD_TIMEOUT):
+        logger.error("等待代码表加载超时。")
+    return bool(item_dict or subway_item_dict)
+
+
+# 空白首页与用户输入无关，渲染一次后缓存 (HTML 文本, ETag)，之后的 GET 请求直接复用
+_empty_page = None
+
+def get_empty_page():
+    """返回缓存的空白首页及其 ETag，首次调用时渲染模板。"""
+    global _empty_page
+    if _empty_page is None:
+        html = render_template('index.html', final_text="", error_message="")
+        etag = hashlib.sha1(html.encode('utf-8')).hexdigest()
+        _empty_page = (html, etag)
+    return _empty_page
 
 
 @app.route('/', methods=['GET', 'POST'])
 def index():
+    # Werkzeug 会为带 GET 的路由自动加上 HEAD，HEAD 同样直接返回缓存的首页
+    if request.method in ('GET', 'HEAD'):
+        html, etag = get_empty_page()
+        response = make_response(html)
+        response.set_etag(etag)
+        # 客户端携带匹配的 If-None-Match 时返回 304
+        return response.make_conditional(request)
+
     final_text = ""
     error_message = ""
-    if request.method == 'POST':
-        user_input = request.form.get('user_input', '')
-        logger.info(f"用户输入:\n{user_input}")
-        lines = user_input.split("\n")
-        results = []
-
-        # 检查是否至少有一个代码表成功加载
-        if not item_dict and not subway_item_dict:
-            error_message = "物品代码表和地铁美化代码表均未加载，请联系管理员检查服务器日志。"
-            logger.error("代码表未加载，无法处理用户请求。")
-        else:
-            for line in lines:
-                stripped_line = line.strip()
-                if not stripped_line:
-                    results.append("")
-                    continue
-
-                # 匹配行首可选的空白字符后跟着一个或多个数字，数字之间可选地用逗号和空白分隔
-                id_match = re.match(r"^\s*(\d+(?:\s*,\s*\d+)*)", stripped_line)
-
-                if not id_match:
-                    results.append(stripped_line) # 如果不匹配数字，则原样返回该行
-                    continue
-
-                numbers_str = id_match.group(1) # 提取匹配到的数字字符串部分
-                numbers = []
-                try:
-                    # 使用正则表达式查找所有数字，并转换为整数
-                    numbers = [int(n) for n in re.findall(r"\d+", numbers_str)]
-                except ValueError:
-                    logger.warning(f"无法解析行首数字，跳过行: '{line}'")
-                    results.append(stripped_line)
-                    continue
-
-                if not numbers: # 如果提取不到任何数字（理论上id_match.group(1)会保证有，但多做一层检查）
-                    results.append(stripped_line)
-                    continue
-
-                final_comment_from_bot = query_item(numbers)
-                id_string = ", ".join(map(str, numbers))
-
-                # 构建输出行：如果有查询结果，则在ID后添加 # 和结果
-                output_line = f"{id_string} #{final_comment_from_bot}" if final_comment_from_bot else id_string
-                # 将处理后的行添加到结果列表
-                results.append(output_line.strip())
-
-            final_text = "\n".join(results)
-            logger.info(f"处理完成，结果文本长度: {len(final_text)}")
-
+    user_input = request.form.get('user_input', '')
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("用户输入:\n%s", user_input)
+
+    # 检查是否至少有一个代码表成功加载
+    if not code_tables_loaded():
+        error_message = CODE_TABLE_NOT_LOADED_MESSAGE
+        logger.error("代码表未加载，无法处理用户请求。")
+    else:
+        final_text = process_text(user_input)
+        logger.info("处理完成，结果文本长度: %s", len(final_text))
 
     # 返回渲染后的模板
     return render_template('index.html', final_text=final_text, error_message=error_message)
 
 
+# 供程序调用的 JSON 批量查询接口，不渲染模板。
+# 请求体为 {"codes": [ID, ...]} 时返回名称串，为 {"text": "..."} 时返回与首页相同的逐行处理结果。
+@app.route('/api/lookup', methods=['POST'])
+def api_lookup():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict) or ("codes" not in body and "text" not in body):
+        return jsonify({"success": False, "message": "请求体必须是包含 'codes' 或 'text' 字段的 JSON 对象。"}), 400
+
+    if not code_tables_loaded():
+        logger.error("代码表未加载，无法处理 API 请求。")
+        return jsonify({"success": False, "message": CODE_TABLE_NOT_LOADED_MESSAGE}), 503
+
+    if "codes" in body:
+        codes = body["codes"]
+        # 只接受真正的 JSON 整数；type() 判断同时排除了 bool，避免 1.9、true、"12" 被悄悄转换成其他 ID
+        if not isinstance(codes, list) or not all(type(code) is int for code in codes):
+            return jsonify({"success": False, "message": "'codes' 必须是整数 ID 列表。"}), 400
+        result = query_item(codes)
+    else:
+        text = body["text"]
+        if not isinstance(text, str):
+            return jsonify({"success": False, "message": "'text' 必须是字符串。"}), 400
+        result = process_text(text)
+    return jsonify({"success": True, "result": result})
+
+
+# 以纯文本流式返回处理结果，逐段发送，客户端无需等待整段输入处理完毕即可收到前面的结果。
+# 表单请求与首页相同，取字段 user_input；其他类型的请求把整个请求体当作文本。
+@app.route('/process', methods=['POST'])
+def process():
+    if request.mimetype in ("application/x-www-form-urlencoded", "multipart/form-data"):
+        # 表单请求的请求体已被解析为表单字段，此时必须提供 user_input
+        user_input = request.form.get('user_input')
+        if user_input is None:
+            return Response("表单请求缺少 'user_input' 字段。", status=400, mimetype="text/plain")
+    else:
+        user_input = request.get_data(as_text=True)
+
+    if not code_tables_loaded():
+        logger.error("代码表未加载，无法处理流式请求。")
+        return Response(CODE_TABLE_NOT_LOADED_MESSAGE, status=503, mimetype="text/plain")
+
+    return Response(iter_processed_chunks(user_input), mimetype="text/plain")
+
+
 # 这个路由在 Vercel 上将无法将文件保存到服务器的文件系统。
 # 如果需要持久化保存，请集成外部存储服务（如数据库或云存储）。
 @app.route('/save_config', methods=['POST'])
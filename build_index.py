@@ -0,0 +1,11 @@
+# 预先解析 data 目录下的文本代码表，并保存为 data/index.pkl 供应用启动时直接读取。
+# 修改代码表后需要重新运行: python build_index.py
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api'))
+
+from index import build_code_table_index
+
+if __name__ == "__main__":
+    build_code_table_index()